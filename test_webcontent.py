@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+
+from webcon_class import webcon
+from webcontent import rank_topics, remove_trash, similarity_scores, to_token
+
+text = (
+    "The company's CEO doesn't think it'll work. We've tried, I’m sure they'd "
+    "go and the students’ union can't wait. Mail bob@example.com for details."
+)
+
+# Pieces left behind by splitting contractions and possessives at the apostrophe
+junk = {"s", "t", "ll", "ve", "m", "d", "doesn", "can't", "ca", "bob", "com"}
+
+
+def test_to_token_splits_clitics():
+    token_list = to_token(text)
+    assert "company" in token_list
+    assert "ceo" in token_list
+    assert junk.isdisjoint(token_list)
+
+
+def test_webcon_to_token_splits_clitics():
+    token_list = webcon().to_token(text)
+    assert "company" in token_list
+    assert "ceo" in token_list
+    assert junk.isdisjoint(token_list)
+
+
+def test_to_token_skips_bare_domains():
+    token_list = to_token("Visit example.com, or news.bbc.co.uk/sport for details.")
+    assert "visit" in token_list
+    assert {"example", "com", "news", "bbc", "co", "uk", "sport"}.isdisjoint(token_list)
+
+
+def test_remove_trash_drops_short_lines():
+    text = "Home | About\nThis line is long enough to keep.\nShare this"
+    assert remove_trash(text) == "This line is long enough to keep."
+
+
+def test_similarity_scores_zero_document():
+    topic_vecs = np.eye(3, dtype=np.float32)
+    doc_vecs = np.array([[2, 0, 0], [0, 0, 0]], dtype=np.float32)
+    scores = similarity_scores(doc_vecs, topic_vecs)
+    assert np.allclose(scores, [[1, 0, 0], [0, 0, 0]])
+
+
+def test_rank_topics_orders_by_similarity():
+    topics = ["art", "war", "food"]
+    similarity = np.array([0.2, 0.7, 0.5], dtype=np.float32)
+
+    result = rank_topics(topics, similarity)
+    assert isinstance(result, pd.DataFrame)
+    assert list(result["topics"]) == ["war", "food", "art"]
+
+    ranked_topics, ranked_similarity = rank_topics(
+        topics, similarity, return_dataframe=False
+    )
+    assert isinstance(ranked_topics, np.ndarray)
+    assert isinstance(ranked_similarity, np.ndarray)
+    assert list(ranked_topics) == ["war", "food", "art"]
+    assert np.allclose(ranked_similarity, [0.7, 0.5, 0.2])
@@ -24,18 +24,29 @@ Redistribution and use in source and binary forms, with or without
     POSSIBILITY OF SUCH DAMAGE.
 """
 
-import pandas as pd
-import spacy
-from boilerpy3 import extractors
-from nltk.corpus import wordnet as wn
-from spacy.lang.en import English
-from textblob import TextBlob
-
-pd.set_option("max_columns", None)
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 
-# Use Spacy package model
-nlp = spacy.load("en_core_web_md")
-parser = English()
+import aiohttp
+import pandas as pd
+import trafilatura
+
+# The model, caches and helpers are shared with webcontent, so Spacy is only
+# loaded once per process whichever interface is used
+from webcontent import (
+    cache_content,
+    cached_content,
+    doc_vectors,
+    extract_content,
+    rank_topics,
+    remove_trash,
+    sentiment,
+    similarity_scores,
+    to_token,
+    topic_vectors,
+)
+
+pd.set_option("display.max_columns", None)
 
 
 class webcon:
@@ -68,6 +79,8 @@ class webcon:
             "literature",
             "crime",
         ]
+        # Warm the cache so the default topics are only processed once
+        topic_vectors(tuple(self.topics), "spacy")
 
     def remove_trash(self, text, min_size=4):
         """
@@ -85,13 +98,7 @@ class webcon:
         cleaned : A string.
 
         """
-        cleaned = ""
-        for i in text.split("\n"):
-            if len(i.split()) <= min_size:
-                continue
-            else:
-                cleaned += i
-        return cleaned
+        return remove_trash(text, min_size)
 
     # Function for tokenising and lammetization of the relevant text
     def to_token(self, text) -> list[str]:
@@ -110,28 +117,7 @@ class webcon:
         token_list : A list.
 
         """
-        token_list = []
-        tokens = parser(text)
-        for token in tokens:
-            if token.orth_.isspace():
-                continue
-            elif token.like_url:  # skip if looks like url
-                continue
-            elif token.orth_.startswith("@"):  # skip if looks like tag
-                continue
-            elif token.orth_.startswith("#"):  # skip if looks like tag
-                continue
-            elif token.is_punct:  # skip if looks like punctuation
-                continue
-            elif token.like_num:  # skip if looks like number
-                continue
-            elif token.is_stop:  # skip if looks like stop words
-                continue
-            else:
-                token_list.append(token.lower_)
-
-            token_list = [str(wn.morphy(x)) if wn.morphy(x) else x for x in token_list]
-        return token_list
+        return to_token(text)
 
     def sentiment(self, text):
         """
@@ -147,10 +133,62 @@ class webcon:
         A textblob.en.sentiments.Sentiment object.
 
         """
-        return TextBlob(text).sentiment
+        return sentiment(text)
+
+    def get_content(self, url):
+        """
+        Your input is a url. The page will be downloaded and trafilatura used
+        to pull out the main article text.
+
+        Parameters
+        ----------
+        url : A string.
+
+        Returns
+        -------
+        content : A string.
+
+        """
+        content = cached_content(url)
+        if content is not None:
+            return content
+
+        # Extract content from web url
+        downloaded = trafilatura.fetch_url(url)
+        if downloaded is None:
+            print("======================================================")
+            print("There were issues retrieving content from this site...")
+            raise ValueError(f"Could not download {url}")
+        content = self.extract_content(downloaded)
+        cache_content(url, content)
+        return content
+
+    def extract_content(self, html):
+        """
+        Your input is the raw html of a page. trafilatura will be used to pull
+        out the main article text.
+
+        Parameters
+        ----------
+        html : Bytes or a string.
+
+        Returns
+        -------
+        content : A string.
+
+        """
+        return extract_content(html)
 
     # Function that takes url and topics (long string of single word topics separated by space) and return topic relevancy scores
-    def classify_web(self, url, min_size=4, topics=None, analyse_sentiment=False):
+    def classify_web(
+        self,
+        url,
+        min_size=4,
+        topics=None,
+        analyse_sentiment=False,
+        return_dataframe=True,
+        backend="spacy",
+    ):
         """
         This function enables users to take any url and return measures of topic
         similarity and sentiment analysis. The only required input is the url.
@@ -166,54 +204,286 @@ class webcon:
 
         analyse_sentiment : Boolean, optional
 
+        return_dataframe : Boolean, optional
+
+        backend : A string, optional. "spacy" (default) scores with averaged word
+        vectors, "sbert" with sentence-transformers embeddings.
+
         Returns
         -------
         A Pandas DataFrame containing topics similarity results and a
         textblob.en.sentiments.Sentiment object containing measures of polarity
-        and subjectivity.
+        and subjectivity. If return_dataframe is False, the DataFrame is replaced
+        by a tuple of numpy arrays (topics, similarity), sorted the same way.
 
         """
+        content = self.get_content(url)
+        return self.classify_content(
+            content,
+            min_size,
+            topics,
+            analyse_sentiment,
+            return_dataframe,
+            backend,
+        )
 
-        if topics is None:
-            topics = self.topics
+    def classify_content(
+        self,
+        content,
+        min_size=4,
+        topics=None,
+        analyse_sentiment=False,
+        return_dataframe=True,
+        backend="spacy",
+    ):
+        """
+        Does the work of classify_web on content that has already been
+        extracted from a page (see get_content).
+
+        Parameters
+        ----------
+        content : A string.
 
-        # Use boilerpy3 ArticleExtractor()
-        extractor = extractors.ArticleExtractor()
+        topics : A list, optional
 
-        # Extract content from web url
-        try:
-            content = extractor.get_content_from_url(url)
-        except AttributeError as e:
-            print("======================================================")
-            print("There were issues retrieving content from this site...")
-            raise e
+        analyse_sentiment : Boolean, optional
 
-        # Join the tokens back up for Spacy nlp function
-        token_join = " ".join(self.to_token(self.remove_trash(content, min_size)))
+        return_dataframe : Boolean, optional
 
-        # doc is the content
-        doc = nlp(token_join)
+        backend : A string, optional. "spacy" (default) scores with averaged word
+        vectors, "sbert" with sentence-transformers embeddings.
+
+        Returns
+        -------
+        The same as classify_web.
+
+        """
+
+        if topics is None:
+            topics = self.topics
+
+        # doc_vec represents the content. The backends take care of averaging or
+        # weighting words, so the cleaned text is used as is rather than going
+        # through to_token
+        doc_vec = doc_vectors([self.remove_trash(content, min_size)], backend)[0]
 
         # topics are the user defined topics
-        topics = " ".join(topics)
-        topic = nlp(topics)
+        topics = " ".join(topics).split()
 
-        # Calculate similarity between content and topics
-        topic_similarity = []
-        for token in topic:
-            topic_similarity.append(doc.similarity(token))
+        # Calculate cosine similarity between content and all topics at once
+        topic_vecs = topic_vectors(tuple(topics), backend)
+        topic_similarity = similarity_scores(doc_vec, topic_vecs)
 
         # Calculate polarity (measure of positivity) and subjectivity
         senti_result = None
         if analyse_sentiment:
             senti_result = self.sentiment(content)
 
-        # Table to capture results
-        data = {"topics": topics.split(), "similarity": topic_similarity}
-        result = (
-            pd.DataFrame(data=data)
-            .sort_values(["similarity"], ascending=[False])
-            .reset_index(drop=True)
-        )
+        return (rank_topics(topics, topic_similarity, return_dataframe), senti_result)
+
+    def classify_webs(
+        self,
+        urls,
+        min_size=4,
+        topics=None,
+        analyse_sentiment=False,
+        return_dataframe=True,
+        backend="spacy",
+        max_workers=16,
+        batch_size=32,
+    ):
+        """
+        Batch version of classify_web. Pages are downloaded concurrently and
+        the extracted content is run through Spacy in batches, which is much
+        faster than calling classify_web once per url.
+
+        Parameters
+        ----------
+        urls : A list of strings.
 
-        return (result, senti_result)
+        topics : A list, optional
+
+        analyse_sentiment : Boolean, optional
+
+        return_dataframe : Boolean, optional
+
+        backend : A string, optional. "spacy" (default) scores with averaged word
+        vectors, "sbert" with sentence-transformers embeddings.
+
+        max_workers : An integer, optional. Number of pages downloaded at once.
+
+        batch_size : An integer, optional. Number of texts Spacy processes at
+        once.
+
+        Returns
+        -------
+        A list with one (DataFrame, Sentiment) tuple per url, in the same order
+        as urls, as returned by classify_web.
+
+        """
+
+        if topics is None:
+            topics = self.topics
+
+        urls = list(urls)
+        if not urls:
+            return []
+
+        # Download and extract all pages concurrently
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            contents = list(executor.map(self.get_content, urls))
+
+        texts = [self.remove_trash(content, min_size) for content in contents]
+
+        # doc_vecs represent the contents
+        doc_vecs = doc_vectors(texts, backend, batch_size)
+
+        # topics are the user defined topics
+        topics = " ".join(topics).split()
+
+        # Score every page against every topic in a single matrix product
+        topic_vecs = topic_vectors(tuple(topics), backend)
+        topic_similarity = similarity_scores(doc_vecs, topic_vecs)
+
+        results = []
+        for content, similarity in zip(contents, topic_similarity):
+            # Calculate polarity (measure of positivity) and subjectivity
+            senti_result = None
+            if analyse_sentiment:
+                senti_result = self.sentiment(content)
+            results.append(
+                (rank_topics(topics, similarity, return_dataframe), senti_result)
+            )
+        return results
+
+    async def classify_web_async(
+        self,
+        url,
+        min_size=4,
+        topics=None,
+        analyse_sentiment=False,
+        return_dataframe=True,
+        backend="spacy",
+        session=None,
+        timeout=10,
+    ):
+        """
+        Asynchronous version of classify_web. The page is downloaded with
+        aiohttp and the extraction and scoring run in the event loop's default
+        executor, so many pages can be classified at once (see
+        classify_webs_async).
+
+        Parameters
+        ----------
+        url : A string.
+
+        topics : A list, optional
+
+        analyse_sentiment : Boolean, optional
+
+        return_dataframe : Boolean, optional
+
+        backend : A string, optional. "spacy" (default) scores with averaged word
+        vectors, "sbert" with sentence-transformers embeddings.
+
+        session : An aiohttp.ClientSession, optional
+
+        timeout : A number, optional. Seconds to wait for the whole download.
+
+        Returns
+        -------
+        The same as classify_web.
+
+        """
+        if session is None:
+            async with aiohttp.ClientSession() as client_session:
+                return await self.classify_web_async(
+                    url,
+                    min_size,
+                    topics,
+                    analyse_sentiment,
+                    return_dataframe,
+                    backend,
+                    client_session,
+                    timeout,
+                )
+
+        # The cache is on disk, so look it up off the event loop too
+        loop = asyncio.get_running_loop()
+        content = await loop.run_in_executor(None, cached_content, url)
+        if content is None:
+            # Extract content from web url
+            async with session.get(
+                url, timeout=aiohttp.ClientTimeout(total=timeout)
+            ) as resp:
+                resp.raise_for_status()
+                html = await resp.read()
+
+        # Keep the CPU bound work off the event loop
+        def classify_html():
+            page = content
+            if page is None:
+                page = self.extract_content(html)
+                cache_content(url, page)
+            return self.classify_content(
+                page,
+                min_size,
+                topics,
+                analyse_sentiment,
+                return_dataframe,
+                backend,
+            )
+
+        return await loop.run_in_executor(None, classify_html)
+
+    async def classify_webs_async(
+        self,
+        urls,
+        min_size=4,
+        topics=None,
+        analyse_sentiment=False,
+        return_dataframe=True,
+        backend="spacy",
+        timeout=10,
+    ):
+        """
+        Classifies every url concurrently with classify_web_async over a single
+        shared aiohttp session.
+
+        Parameters
+        ----------
+        urls : A list of strings.
+
+        topics : A list, optional
+
+        analyse_sentiment : Boolean, optional
+
+        return_dataframe : Boolean, optional
+
+        backend : A string, optional. "spacy" (default) scores with averaged word
+        vectors, "sbert" with sentence-transformers embeddings.
+
+        timeout : A number, optional. Seconds to wait for each download.
+
+        Returns
+        -------
+        A list with one (DataFrame, Sentiment) tuple per url, in the same order
+        as urls, as returned by classify_web.
+
+        """
+        async with aiohttp.ClientSession() as session:
+            return await asyncio.gather(
+                *[
+                    self.classify_web_async(
+                        url,
+                        min_size,
+                        topics,
+                        analyse_sentiment,
+                        return_dataframe,
+                        backend,
+                        session,
+                        timeout,
+                    )
+                    for url in urls
+                ]
+            )
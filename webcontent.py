@@ -24,19 +24,77 @@ Redistribution and use in source and binary forms, with or without
     POSSIBILITY OF SUCH DAMAGE.
 """
 
+import asyncio
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from functools import cache, lru_cache
+
+import aiohttp
+import numpy as np
 import pandas as pd
 import requests
 import spacy
-from boilerpy3 import extractors
+import trafilatura
+from diskcache import Cache
 from nltk.corpus import wordnet as wn
-from spacy.lang.en import English
+from requests.adapters import HTTPAdapter
+from spacy.lang.en.stop_words import STOP_WORDS
+from spacy.vectors import Vectors
 
-# pd.set_option("max_columns", None)
+# pd.set_option("display.max_columns", None)
 from textblob import TextBlob
 
-# Use Spacy package model
-nlp = spacy.load("en_core_web_md")
-parser = English()
+# Use Spacy package model. Only the static word vectors are needed for
+# similarity, so none of the trained pipeline components are loaded
+exclude = [
+    "tok2vec",
+    "tagger",
+    "parser",
+    "senter",
+    "attribute_ruler",
+    "lemmatizer",
+    "ner",
+]
+
+# If WEBCON_VECTORS points at a vectors table saved with Vectors.to_disk (for
+# example a pruned copy of en_core_web_md's), the small model is loaded and the
+# table attached to it, rather than loading the full medium model
+vectors_path = os.environ.get("WEBCON_VECTORS")
+if vectors_path:
+    nlp = spacy.load("en_core_web_sm", exclude=exclude)
+    nlp.vocab.vectors = Vectors(strings=nlp.vocab.strings).from_disk(vectors_path)
+else:
+    nlp = spacy.load("en_core_web_md", exclude=exclude)
+
+# If WEBCON_CACHE is set, content extracted from each url is kept in a
+# diskcache directory at that path for cache_expiry seconds, so repeat
+# classifications of the same page skip the download and extraction. diskcache
+# can be shared between threads and processes, and drops expired entries itself
+cache_path = os.environ.get("WEBCON_CACHE")
+cache_expiry = 24 * 60 * 60
+content_cache = Cache(cache_path) if cache_path else None
+
+# all-MiniLM-L6-v2 truncates its input at 256 word pieces, which is roughly
+# 180 English words, so the "sbert" backend embeds texts in chunks of this
+# many words, leaving room for words that split into several pieces
+sbert_chunk_words = 128
+
+stop_words = frozenset(STOP_WORDS)
+
+# Patterns used by to_token to pick words out of the text. Urls are anything
+# with a scheme or www, emails, and bare domains ending in a common suffix
+url_pattern = re.compile(
+    r"\S*(?:://|www\.)\S*|\S+@\S+"
+    r"|\S+\.(?:com|org|net|edu|gov|info|biz|io|co|uk|us|ca|au|de|fr|me|ly|tv)\b\S*"
+)
+tag_pattern = re.compile(r"[@#]\w+")
+word_pattern = re.compile(r"[^\W\d_]+(?:['‘’][^\W\d_]+)*")
+
+# Clitics are split off the way Spacy does ("doesn't" -> "does" + "n't"). The
+# clitic itself is always a stop word, and a few stems need their full form
+clitic_pattern = re.compile(r"(?:n['‘’]t|['‘’](?:s|ll|ve|re|m|d))$")
+clitic_stems = {"ca": "can", "wo": "will", "sha": "shall", "ai": "am"}
 
 # Topic are the topics of interest - user should first decide which topics to be included for analysis
 topics = [
@@ -71,6 +129,103 @@ topics = [
     "postmortem",
 ]
 
+
+@cache
+def sbert_model():
+    """
+    Loads the sentence-transformers model used by the "sbert" backend. The
+    model is only loaded on first use and runs in half precision on a GPU.
+
+    Returns
+    -------
+    A sentence_transformers.SentenceTransformer object.
+
+    """
+    # Optional dependency, only needed for the "sbert" backend
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
+    if model.device.type == "cuda":
+        model.half()
+    return model
+
+
+def doc_vectors(texts, backend="spacy", batch_size=32):
+    """
+    Your input is a list of texts. Returns one vector per text, either the
+    average of Spacy's word vectors or of the sentence-transformers embeddings
+    of its chunks of sbert_chunk_words words.
+
+    Parameters
+    ----------
+    texts : A list of strings.
+
+    backend : A string, optional. "spacy" or "sbert".
+
+    batch_size : An integer, optional. Number of texts processed at once.
+
+    Returns
+    -------
+    doc_vecs : A numpy array with one row per text.
+
+    """
+    if backend == "spacy":
+        return np.stack([doc.vector for doc in nlp.pipe(texts, batch_size=batch_size)])
+    if backend == "sbert":
+        # The model only reads the first 256 word pieces of a text, so texts
+        # are split into chunks it can read whole and the chunks averaged
+        chunks, owners = [], []
+        for i, text in enumerate(texts):
+            words = text.split()
+            pieces = [
+                " ".join(words[j : j + sbert_chunk_words])
+                for j in range(0, len(words), sbert_chunk_words)
+            ] or [""]
+            chunks.extend(pieces)
+            owners.extend([i] * len(pieces))
+        chunk_vecs = sbert_model().encode(
+            chunks, batch_size=batch_size, normalize_embeddings=True
+        )
+        doc_vecs = np.zeros((len(texts), chunk_vecs.shape[1]), np.float32)
+        np.add.at(doc_vecs, owners, chunk_vecs.astype(np.float32))
+        return doc_vecs / np.bincount(owners)[:, None]
+    raise ValueError(f'backend must be "spacy" or "sbert", not {backend!r}')
+
+
+@lru_cache(maxsize=32)
+def topic_vectors(topics, backend="spacy"):
+    """
+    Your input is a tuple of single word topics. The topics will be turned into
+    vectors with the chosen backend (see doc_vectors) and scaled to unit
+    length. Results are cached, so each set of topics is only processed once.
+
+    Parameters
+    ----------
+    topics : A tuple of strings.
+
+    backend : A string, optional. "spacy" or "sbert".
+
+    Returns
+    -------
+    topic_vecs : A read-only numpy array with one row per topic. Topics without
+    a vector are left as zero rows.
+
+    """
+    if backend == "spacy":
+        topic_vecs = np.stack([token.vector for token in nlp(" ".join(topics))])
+    else:
+        topic_vecs = doc_vectors(list(topics), backend)
+    norms = np.linalg.norm(topic_vecs, axis=1, keepdims=True)
+    topic_vecs = np.divide(
+        topic_vecs, norms, out=np.zeros_like(topic_vecs), where=norms > 0
+    )
+    topic_vecs.flags.writeable = False
+    return topic_vecs
+
+
+# The default topics only need to go through the pipeline once per process
+topic_vectors(tuple(topics), "spacy")
+
 # Function for removing irrelevant parts of the extracted text
 
 
@@ -90,13 +245,28 @@ def remove_trash(text, min_size=4):
     cleaned : A string.
 
     """
-    cleaned = ""
-    for i in text.split("\n"):
-        if len(i.split()) <= min_size:
-            continue
-        else:
-            cleaned += i
-    return cleaned
+    return "".join(i for i in text.split("\n") if len(i.split()) > min_size)
+
+
+@lru_cache(maxsize=65536)
+def lemmatise(word):
+    """
+    Your input is a single word. Returns the WordNet base form of the word, or
+    the word unchanged if WordNet does not know it. Results are cached, as
+    the same words come up again and again in web pages. WordNet itself is
+    only loaded on the first call, so only to_token needs the nltk corpus.
+
+    Parameters
+    ----------
+    word : A string.
+
+    Returns
+    -------
+    A string.
+
+    """
+    lemma = wn.morphy(word)
+    return lemma if lemma else word
 
 
 # Function for tokenising and lammetization of the relevant text
@@ -118,27 +288,23 @@ def to_token(text) -> list[str]:
     token_list : A list.
 
     """
+    # Words are runs of letters, so punctuation and numbers never make it in
+    text = url_pattern.sub(" ", text)  # skip if looks like url or email
+    text = tag_pattern.sub(" ", text)  # skip if looks like tag
     token_list: list[str] = []
-    tokens = parser(text)
-    for token in tokens:
-        if token.orth_.isspace():
-            continue
-        elif token.like_url:  # skip if looks like url
-            continue
-        elif token.orth_.startswith("@"):  # skip if looks like tag
-            continue
-        elif token.orth_.startswith("#"):  # skip if looks like tag
-            continue
-        elif token.is_punct:  # skip if looks like punctuation
-            continue
-        elif token.like_num:  # skip if looks like number
+    for word in word_pattern.findall(text):
+        low = word.lower()
+        clitic = clitic_pattern.search(low)
+        if clitic:
+            low = low[: clitic.start()]
+            low = clitic_stems.get(low, low)
+        if len(low) < 2:  # skip if too short to be a word
             continue
-        elif token.is_stop:  # skip if looks like stop words
+        elif low in stop_words:  # skip if looks like stop words
             continue
-        else:
-            token_list.append(token.lower_)
+        token_list.append(low)
 
-        token_list = [str(wn.morphy(x)) if wn.morphy(x) else x for x in token_list]
+    token_list = [lemmatise(x) for x in token_list]
     return token_list
 
 
@@ -159,10 +325,186 @@ def sentiment(text):
     return TextBlob(text).sentiment
 
 
+@cache
+def http_session(pool_maxsize):
+    """
+    Returns a requests session shared by the whole process, so connections to
+    the same hosts are kept alive and reused across calls rather than opened
+    for every page. There is one session per connection pool size, so callers
+    should stick to a few sizes (get_content uses 16).
+
+    Parameters
+    ----------
+    pool_maxsize : An integer. Connections kept open per host, which should be
+    at least the number of threads downloading at once.
+
+    Returns
+    -------
+    A requests.Session object.
+
+    """
+    session = requests.Session()
+    session.mount("http://", HTTPAdapter(pool_maxsize=pool_maxsize))
+    session.mount("https://", HTTPAdapter(pool_maxsize=pool_maxsize))
+    return session
+
+
+def get_content(url, session=None, timeout=10):
+    """
+    Your input is a url. The page will be downloaded and trafilatura used to
+    pull out the main article text.
+
+    Parameters
+    ----------
+    url : A string.
+
+    session : A requests.Session, optional. Defaults to http_session(16).
+
+    timeout : A number, optional. Seconds to wait for the server to respond.
+
+    Returns
+    -------
+    content : A string.
+
+    """
+    content = cached_content(url)
+    if content is not None:
+        return content
+
+    if session is None:
+        session = http_session(16)
+
+    # Extract content from web url
+    resp = session.get(url, timeout=timeout)
+    resp.raise_for_status()
+    content = extract_content(resp.content)
+    cache_content(url, content)
+    return content
+
+
+def extract_content(html):
+    """
+    Your input is the raw html of a page. trafilatura will be used to pull out
+    the main article text.
+
+    Parameters
+    ----------
+    html : Bytes or a string.
+
+    Returns
+    -------
+    content : A string.
+
+    """
+    # trafilatura parses with lxml, which also works out the page encoding
+    return trafilatura.extract(html, include_comments=False) or ""
+
+
+def cached_content(url):
+    """
+    Your input is a url. If caching is switched on (see cache_path), returns
+    the content previously extracted from that url, or None if there is none
+    or it is older than cache_expiry seconds.
+
+    Parameters
+    ----------
+    url : A string.
+
+    Returns
+    -------
+    content : A string or None.
+
+    """
+    if content_cache is None:
+        return None
+    return content_cache.get(url)
+
+
+def cache_content(url, content):
+    """
+    Your input is a url and the content extracted from it. If caching is
+    switched on (see cache_path), the content is saved for cached_content.
+    Empty content is not saved, as it usually means the page was blocked or
+    nothing could be extracted, which may not be the case next time.
+
+    Parameters
+    ----------
+    url : A string.
+
+    content : A string.
+
+    """
+    if content_cache is None or not content:
+        return
+    content_cache.set(url, content, expire=cache_expiry)
+
+
+def similarity_scores(doc_vecs, topic_vecs):
+    """
+    Your input is a document vector (or a matrix of them) and a matrix of unit
+    length topic vectors (see topic_vectors). Returns the cosine similarity
+    between every document and every topic, with topics in the same order as
+    the rows of topic_vecs. Like Spacy's similarity, anything without a vector
+    scores 0.
+
+    Parameters
+    ----------
+    doc_vecs : A numpy array, either a single vector or one row per document.
+
+    topic_vecs : A numpy array with one row per topic.
+
+    Returns
+    -------
+    A numpy array with one entry per topic, or one row per document and one
+    column per topic.
+
+    """
+    # Normalise the documents once, then it is a plain matrix product
+    norms = np.linalg.norm(doc_vecs, axis=-1, keepdims=True)
+    doc_vecs = np.divide(doc_vecs, norms, out=np.zeros_like(doc_vecs), where=norms > 0)
+    return doc_vecs @ topic_vecs.T
+
+
+def rank_topics(topics, topic_similarity, return_dataframe=True):
+    """
+    Your input is a list of topics and their similarity scores. Returns the
+    topics sorted from most to least similar, either as a table or as a pair
+    of numpy arrays.
+
+    Parameters
+    ----------
+    topics : A list of strings.
+
+    topic_similarity : A numpy array.
+
+    return_dataframe : Boolean, optional
+
+    Returns
+    -------
+    result : A Pandas DataFrame, or a tuple of numpy arrays (topics,
+    similarity) if return_dataframe is False.
+
+    """
+    order = np.argsort(-topic_similarity, kind="stable")
+    topics = np.asarray(topics)[order]
+    topic_similarity = topic_similarity[order]
+    if not return_dataframe:
+        return (topics, topic_similarity)
+
+    # Table to capture results
+    return pd.DataFrame(data={"topics": topics, "similarity": topic_similarity})
+
+
 # Function that takes url and topics (long string of single word topics separated by space) and return topic relevancy scores
 
 
-def classify_web(url, topics=topics, analyse_sentiment=False):
+def classify_web(
+    url,
+    topics=topics,
+    analyse_sentiment=False,
+    return_dataframe=True,
+    backend="spacy",
+):
     """
     This function enables users to take any url and return measures of topic
     similarity and sentiment analysis. The only required input is the url.
@@ -178,51 +520,265 @@ def classify_web(url, topics=topics, analyse_sentiment=False):
 
     analyse_sentiment : Boolean, optional
 
+    return_dataframe : Boolean, optional
+
+    backend : A string, optional. "spacy" (default) scores with averaged word
+    vectors, "sbert" with sentence-transformers embeddings.
+
     Returns
     -------
     A Pandas DataFrame containing topics similarity results and a
     textblob.en.sentiments.Sentiment object containing measures of polarity
-    and subjectivity.
+    and subjectivity. If return_dataframe is False, the DataFrame is replaced
+    by a tuple of numpy arrays (topics, similarity), sorted the same way.
 
     """
-    # Use boilerpy3 ArticleExtractor()
-    extractor = extractors.ArticleExtractor()
+    content = get_content(url)
+    return classify_content(
+        content, topics, analyse_sentiment, return_dataframe, backend
+    )
 
-    # Extract content from web url
-    resp = requests.get(url)
 
-    # content = extractor.get_content_from_url(url)
-    content = extractor.get_content(resp.content.decode("utf-8"))
+def classify_content(
+    content,
+    topics=topics,
+    analyse_sentiment=False,
+    return_dataframe=True,
+    backend="spacy",
+):
+    """
+    Does the work of classify_web on content that has already been extracted
+    from a page (see get_content).
+
+    Parameters
+    ----------
+    content : A string.
+
+    topics : A list, optional
+
+    analyse_sentiment : Boolean, optional
+
+    return_dataframe : Boolean, optional
 
-    # Join the tokens back up for Spacy nlp function
-    token_join = " ".join(to_token(remove_trash(content)))
+    backend : A string, optional. "spacy" (default) scores with averaged word
+    vectors, "sbert" with sentence-transformers embeddings.
 
-    # doc is the content
-    doc = nlp(token_join)
+    Returns
+    -------
+    The same as classify_web.
+
+    """
+    # doc_vec represents the content. The backends take care of averaging or
+    # weighting words, so the cleaned text is used as is rather than going
+    # through to_token
+    doc_vec = doc_vectors([remove_trash(content)], backend)[0]
 
     # topics are the user defined topics
-    topics = " ".join(topics)
-    topic = nlp(topics)
+    topics = " ".join(topics).split()
 
-    # Calculate similarity between content and topics
-    topic_similarity = []
-    for token in topic:
-        topic_similarity.append(doc.similarity(token))
+    # Calculate cosine similarity between content and all topics at once
+    topic_vecs = topic_vectors(tuple(topics), backend)
+    topic_similarity = similarity_scores(doc_vec, topic_vecs)
 
     # Calculate polarity (measure of positivity) and subjectivity
     senti_result = None
     if analyse_sentiment:
         senti_result = sentiment(content)
 
-    # Table to capture results
-    data = {"topics": topics.split(), "similarity": topic_similarity}
-    result = (
-        pd.DataFrame(data=data)
-        .sort_values(["similarity"], ascending=[False])
-        .reset_index(drop=True)
-    )
+    return (rank_topics(topics, topic_similarity, return_dataframe), senti_result)
 
-    return (result, senti_result)
+
+def classify_webs(
+    urls,
+    topics=topics,
+    analyse_sentiment=False,
+    return_dataframe=True,
+    backend="spacy",
+    max_workers=16,
+    batch_size=32,
+):
+    """
+    Batch version of classify_web. Pages are downloaded concurrently over a
+    shared session and the extracted content is run through Spacy in batches,
+    which is much faster than calling classify_web once per url.
+
+    Parameters
+    ----------
+    urls : A list of strings.
+
+    topics : A list, optional
+
+    analyse_sentiment : Boolean, optional
+
+    return_dataframe : Boolean, optional
+
+    backend : A string, optional. "spacy" (default) scores with averaged word
+    vectors, "sbert" with sentence-transformers embeddings.
+
+    max_workers : An integer, optional. Number of pages downloaded at once.
+
+    batch_size : An integer, optional. Number of texts Spacy processes at once.
+
+    Returns
+    -------
+    A list with one (DataFrame, Sentiment) tuple per url, in the same order as
+    urls, as returned by classify_web.
+
+    """
+    urls = list(urls)
+    if not urls:
+        return []
+
+    # Download and extract all pages concurrently over a shared session with a
+    # connection pool big enough for every worker
+    session = http_session(max(16, max_workers))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        contents = list(executor.map(lambda url: get_content(url, session), urls))
+
+    texts = [remove_trash(content) for content in contents]
+
+    # doc_vecs represent the contents
+    doc_vecs = doc_vectors(texts, backend, batch_size)
+
+    # topics are the user defined topics
+    topics = " ".join(topics).split()
+
+    # Score every page against every topic in a single matrix product
+    topic_vecs = topic_vectors(tuple(topics), backend)
+    topic_similarity = similarity_scores(doc_vecs, topic_vecs)
+
+    results = []
+    for content, similarity in zip(contents, topic_similarity):
+        # Calculate polarity (measure of positivity) and subjectivity
+        senti_result = None
+        if analyse_sentiment:
+            senti_result = sentiment(content)
+        results.append(
+            (rank_topics(topics, similarity, return_dataframe), senti_result)
+        )
+    return results
+
+
+async def classify_web_async(
+    url,
+    topics=topics,
+    analyse_sentiment=False,
+    return_dataframe=True,
+    backend="spacy",
+    session=None,
+    timeout=10,
+):
+    """
+    Asynchronous version of classify_web. The page is downloaded with aiohttp
+    and the extraction and scoring run in the event loop's default executor,
+    so many pages can be classified at once (see classify_webs_async).
+
+    Parameters
+    ----------
+    url : A string.
+
+    topics : A list, optional
+
+    analyse_sentiment : Boolean, optional
+
+    return_dataframe : Boolean, optional
+
+    backend : A string, optional. "spacy" (default) scores with averaged word
+    vectors, "sbert" with sentence-transformers embeddings.
+
+    session : An aiohttp.ClientSession, optional
+
+    timeout : A number, optional. Seconds to wait for the whole download.
+
+    Returns
+    -------
+    The same as classify_web.
+
+    """
+    if session is None:
+        async with aiohttp.ClientSession() as client_session:
+            return await classify_web_async(
+                url,
+                topics,
+                analyse_sentiment,
+                return_dataframe,
+                backend,
+                client_session,
+                timeout,
+            )
+
+    # The cache is on disk, so look it up off the event loop too
+    loop = asyncio.get_running_loop()
+    content = await loop.run_in_executor(None, cached_content, url)
+    if content is None:
+        # Extract content from web url
+        async with session.get(
+            url, timeout=aiohttp.ClientTimeout(total=timeout)
+        ) as resp:
+            resp.raise_for_status()
+            html = await resp.read()
+
+    # Keep the CPU bound work off the event loop
+    def classify_html():
+        page = content
+        if page is None:
+            page = extract_content(html)
+            cache_content(url, page)
+        return classify_content(
+            page, topics, analyse_sentiment, return_dataframe, backend
+        )
+
+    return await loop.run_in_executor(None, classify_html)
+
+
+async def classify_webs_async(
+    urls,
+    topics=topics,
+    analyse_sentiment=False,
+    return_dataframe=True,
+    backend="spacy",
+    timeout=10,
+):
+    """
+    Classifies every url concurrently with classify_web_async over a single
+    shared aiohttp session.
+
+    Parameters
+    ----------
+    urls : A list of strings.
+
+    topics : A list, optional
+
+    analyse_sentiment : Boolean, optional
+
+    return_dataframe : Boolean, optional
+
+    backend : A string, optional. "spacy" (default) scores with averaged word
+    vectors, "sbert" with sentence-transformers embeddings.
+
+    timeout : A number, optional. Seconds to wait for each download.
+
+    Returns
+    -------
+    A list with one (DataFrame, Sentiment) tuple per url, in the same order as
+    urls, as returned by classify_web.
+
+    """
+    async with aiohttp.ClientSession() as session:
+        return await asyncio.gather(
+            *[
+                classify_web_async(
+                    url,
+                    topics,
+                    analyse_sentiment,
+                    return_dataframe,
+                    backend,
+                    session,
+                    timeout,
+                )
+                for url in urls
+            ]
+        )
 
 
 if __name__ == "__main__":